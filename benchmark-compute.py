@@ -0,0 +1,40 @@
+import time
+import random
+import argparse
+
+import compute
+
+
+def random_edges(n, m, seed):
+    rng = random.Random(seed)
+    pairs = [(u, v) for u in range(n) for v in range(u + 1, n)]
+    return rng.sample(pairs, min(m, len(pairs)))
+
+
+def timed(fn, *args):
+    t = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - t
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--nodes', type=int, default=40)
+    parser.add_argument('-m', '--edges', type=int, nargs='+',
+                        default=[25, 50, 100, 200])
+    parser.add_argument('-e', '--engine', action='append',
+                        choices=sorted(compute.ENGINES))
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    args = parser.parse_args()
+    engines = args.engine or sorted(compute.ENGINES)
+
+    print('%6s' % 'm' + ''.join('%14s' % e for e in engines))
+    for m in args.edges:
+        edges = random_edges(args.nodes, m, args.seed)
+        times = [timed(compute.ENGINES[e], edges, args.nodes)
+                 for e in engines]
+        print('%6s' % len(edges) + ''.join('%13.3fs' % t for t in times))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,16 @@
+import os
+import sys
 import string
+import struct
+import hashlib
+import tempfile
+import time
+from array import array
+from bisect import bisect_left, bisect_right
 from functools import partial
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
 
 
 class Element(namedtuple('Element', 'type x')):
@@ -21,14 +31,40 @@ Node = partial(Element, NODE)
 
 
 class UnionFind:
-    def __init__(self):
+    '''
+    With track_members, every set also keeps its elements on a circular
+    list threaded through `next` and its number of Node elements in
+    `nodes`, so component() and node_count() cost time proportional to the
+    component rather than to the whole structure.
+
+    >>> uf = UnionFind(track_members=True)
+    >>> for v in (Edge(0), Node(1), Node(2), Node(3)):
+    ...     uf.make_set(v)
+    >>> uf.union(Edge(0), Node(1)); uf.union(Edge(0), Node(2))
+    >>> sorted(uf.component(Node(2))), uf.node_count(Edge(0))
+    ([Edge(0), Node(1), Node(2)], 2)
+    '''
+
+    def __init__(self, track_members=False):
         self.rep = {}
+        self.track_members = track_members
+        if track_members:
+            self.next = {}
+            self.nodes = {}
 
     def make_set(self, v):
-        self.rep.setdefault(v, v)
+        if v in self.rep:
+            return
+        self.rep[v] = v
+        if self.track_members:
+            self.next[v] = v
+            self.nodes[v] = int(v.type == NODE)
 
     def link(self, u, v):
         self.rep[u] = v
+        if self.track_members and u != v:
+            self.next[u], self.next[v] = self.next[v], self.next[u]
+            self.nodes[v] += self.nodes.pop(u)
 
     def find(self, u):
         while self.rep[u] != u:
@@ -42,18 +78,352 @@ class UnionFind:
         return self.find(u) == self.find(v)
 
     def component(self, u):
+        if self.track_members:
+            return _circular(self.next, u)
         r = self.find(u)
         return (v for v in self.rep if self.find(v) == r)
 
+    def node_count(self, u):
+        if self.track_members:
+            return self.nodes[self.find(u)]
+        return sum(v.type == NODE for v in self.component(u))
+
+
+def _circular(next, u):
+    v = u
+    while True:
+        yield v
+        v = next[v]
+        if v == u:
+            break
+
+
+class ArrayUnionFind:
+    '''
+    Union-find over the integers 0..m+n-1, where Edge(j) is j and Node(u) is
+    m + u. Parents and ranks live in flat int32 arrays that are reused
+    across reset() calls. With track_members, members and node counts are
+    kept per root as in UnionFind.
+
+    >>> uf = ArrayUnionFind(2, 3, track_members=True)
+    >>> uf.union(uf.edge(0), uf.node(2)) == uf.find(uf.node(2))
+    True
+    >>> uf.connected(uf.edge(0), uf.node(2)), uf.connected(0, 1)
+    (True, False)
+    >>> sorted(uf.component_nodes(0)), uf.node_count(0)
+    ([2], 1)
+    >>> uf.reset()
+    >>> uf.connected(uf.edge(0), uf.node(2))
+    False
+    '''
+
+    def __init__(self, m, n, track_members=False):
+        self.m = m
+        self._identity = array('i', range(m + n))
+        self._zeros = array('i', [0]) * (m + n)
+        self.parent = array('i', self._identity)
+        self.rank = array('i', self._zeros)
+        self.track_members = track_members
+        if track_members:
+            self._node_flags = array('i', [0]) * m + array('i', [1]) * n
+            self.next = array('i', self._identity)
+            self.nodes = array('i', self._node_flags)
+
+    def edge(self, j):
+        return j
+
+    def node(self, u):
+        return self.m + u
+
+    def reset(self):
+        self.parent[:] = self._identity
+        self.rank[:] = self._zeros
+        if self.track_members:
+            self.next[:] = self._identity
+            self.nodes[:] = self._node_flags
+
+    def find(self, u):
+        parent = self.parent
+        while parent[u] != u:
+            parent[u] = u = parent[parent[u]]
+        return u
+
+    def union(self, u, v):
+        u, v = self.find(u), self.find(v)
+        if u != v:
+            rank = self.rank
+            if rank[u] > rank[v]:
+                u, v = v, u
+            elif rank[u] == rank[v]:
+                rank[v] += 1
+            self.parent[u] = v
+            if self.track_members:
+                next = self.next
+                next[u], next[v] = next[v], next[u]
+                self.nodes[v] += self.nodes[u]
+        return v
+
+    def connected(self, u, v):
+        return self.find(u) == self.find(v)
+
+    def component(self, u):
+        if self.track_members:
+            return _circular(self.next, u)
+        r = self.find(u)
+        return (v for v in range(len(self.parent)) if self.find(v) == r)
+
+    def component_nodes(self, u):
+        m = self.m
+        return (v - m for v in self.component(u) if v >= m)
+
+    def node_count(self, u):
+        if self.track_members:
+            return self.nodes[self.find(u)]
+        return sum(1 for v in self.component_nodes(u))
+
+
+class RollbackUnionFind:
+    '''
+    Union-find over 0..n-1 with union by rank and no path compression, so
+    that every union can be undone. checkpoint() marks the current state
+    and rollback() undoes all unions made since.
+
+    >>> uf = RollbackUnionFind(4)
+    >>> uf.union(0, 1)
+    >>> cp = uf.checkpoint()
+    >>> uf.union(1, 2)
+    >>> sorted(uf.component(2)), uf.node_count(0)
+    ([0, 1, 2], 3)
+    >>> uf.rollback(cp)
+    >>> sorted(uf.component(2)), uf.node_count(0)
+    ([2], 2)
+    '''
+
+    def __init__(self, n):
+        self.parent = array('i', range(n))
+        self.rank = array('i', [0]) * n
+        self.next = array('i', range(n))
+        self.nodes = array('i', [1]) * n
+        self._ops = []
+
+    def find(self, u):
+        parent = self.parent
+        while parent[u] != u:
+            u = parent[u]
+        return u
+
+    def union(self, u, v):
+        u, v = self.find(u), self.find(v)
+        if u == v:
+            return
+        rank = self.rank
+        if rank[u] > rank[v]:
+            u, v = v, u
+        grew = rank[u] == rank[v]
+        if grew:
+            rank[v] += 1
+        self.parent[u] = v
+        self._splice(u, v)
+        self.nodes[v] += self.nodes[u]
+        self._ops.append((u, v, grew))
+
+    def _splice(self, u, v):
+        next = self.next
+        next[u], next[v] = next[v], next[u]
+
+    def connected(self, u, v):
+        return self.find(u) == self.find(v)
+
+    def component(self, u):
+        return _circular(self.next, u)
+
+    def node_count(self, u):
+        return self.nodes[self.find(u)]
+
+    def checkpoint(self):
+        return len(self._ops)
+
+    def rollback(self, checkpoint):
+        ops = self._ops
+        while len(ops) > checkpoint:
+            u, v, grew = ops.pop()
+            self.nodes[v] -= self.nodes[u]
+            self._splice(u, v)
+            self.parent[u] = u
+            if grew:
+                self.rank[v] -= 1
+
+
+class NodeSets:
+    '''
+    Intern table handing out a small integer id for every distinct node set.
+    Node sets are bitmasks over node indices, see nodes_mask().
+
+    >>> sets = NodeSets()
+    >>> sets.intern(0b110), sets.intern(0b1000), sets.intern(0b110)
+    (0, 1, 0)
+    >>> list(mask_nodes(sets[0])), len(sets)
+    ([1, 2], 2)
+    '''
+
+    def __init__(self):
+        self._ids = {}
+        self._masks = []
+
+    def intern(self, mask):
+        try:
+            return self._ids[mask]
+        except KeyError:
+            k = self._ids[mask] = len(self._masks)
+            self._masks.append(mask)
+            return k
+
+    def __getitem__(self, k):
+        return self._masks[k]
+
+    def __len__(self):
+        return len(self._masks)
+
+    def __iter__(self):
+        return iter(self._masks)
+
+    def copy(self):
+        sets = NodeSets()
+        sets._ids = dict(self._ids)
+        sets._masks = list(self._masks)
+        return sets
+
+
+def nodes_mask(nodes):
+    '''
+    >>> bin(nodes_mask([0, 2, 5]))
+    '0b100101'
+    '''
+    mask = 0
+    for x in nodes:
+        mask |= 1 << x
+    return mask
+
+
+def mask_nodes(mask):
+    '''
+    >>> list(mask_nodes(0b100101))
+    [0, 2, 5]
+    '''
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def mask_names(mask, node_names):
+    return ''.join(sorted(node_names[x] for x in mask_nodes(mask)))
+
+
+MISSING = -1
+
+
+Runs = namedtuple('Runs', 'offsets ids')
+
+
+class IntervalComponents:
+    '''
+    Node set of the component containing Edge(i) and Edge(j) in the window
+    edges[i..j], for every pair where the two edges are connected.
+
+    The component of Edge(i) only grows as the window widens, so row i is
+    stored as runs: int32 arrays `offsets` and `ids` where the component
+    has the node set with id ids[x] in the windows edges[i..j] with
+    offsets[x] <= j - i < offsets[x + 1]. Edge(j) is connected to Edge(i)
+    when its first endpoint is in that set. A row has at most n runs, and
+    each distinct node set is stored once in `sets` as a bitmask.
+
+    >>> components = components_incremental([(0, 1), (2, 3), (1, 2)], 4)
+    >>> bin(components[0, 2]), components.set_id(0, 1) == MISSING
+    ('0b1111', True)
+    >>> components[1, 0]
+    Traceback (most recent call last):
+      ...
+    KeyError: (1, 0)
+    >>> components = components_bitset([(0, 0), (0, 1), (1, 1)], 2)
+    >>> bin(components[0, 0]), bin(components[0, 2])
+    ('0b1', '0b11')
+    '''
+
+    def __init__(self, edges, rows=None, sets=None):
+        self.edges = edges
+        self.sets = NodeSets() if sets is None else sets
+        self.rows = [] if rows is None else rows
+
+    def add_row(self):
+        row = Runs(array('i'), array('i'))
+        self.rows.append(row)
+        return row
+
+    def component_id(self, i, j):
+        '''
+        The set id of the component of Edge(i) in the window edges[i..j].
+        '''
+        if not 0 <= i <= j < len(self.edges):
+            raise KeyError((i, j))
+        offsets, ids = self.rows[i]
+        return ids[bisect_right(offsets, j - i) - 1]
+
+    def compact(self):
+        '''
+        Drop the node sets no row refers to, renumbering the rest.
+
+        >>> components = components_incremental([(0, 1), (1, 2)], 3)
+        >>> k = components.sets.intern(0b100)
+        >>> components.compact()
+        >>> len(components.sets), bin(components[0, 1])
+        (3, '0b111')
+        '''
+        old = self.sets
+        sets = NodeSets()
+        rows = []
+        for offsets, ids in self.rows:
+            rows.append(Runs(offsets, array(
+                'i', (sets.intern(old[k]) for k in ids))))
+        self.sets = sets
+        self.rows = rows
+
+    def set_id(self, i, j):
+        k = self.component_id(i, j)
+        return k if self.sets[k] >> self.edges[j][0] & 1 else MISSING
+
+    def __getitem__(self, key):
+        k = self.set_id(*key)
+        if k == MISSING:
+            raise KeyError(key)
+        return self.sets[k]
 
-def process_graph(edge_lists, edges, node_names):
-    print('process_graph, %s edges, hash(edges)=%s, hash(weights)=%s' %
-          (len(edges), hash(frozenset(edges)), hash(tuple(edges))))
 
-    components = {}
+def _masks_nbytes(masks):
+    # The int objects, plus their entries in the NodeSets tables
+    return sum(mask.bit_length() // 8 + 120 for mask in masks)
+
+
+def _cell_runs(row):
+    '''
+    The runs of a row given as an int32 array of set ids indexed by j - i,
+    with MISSING where Edge(j) is not connected to Edge(i).
+    '''
+    runs = Runs(array('i'), array('i'))
+    for x, k in enumerate(row):
+        if k != MISSING and (not runs.ids or runs.ids[-1] != k):
+            runs.offsets.append(x)
+            runs.ids.append(k)
+    return runs
+
+
+def components_reference(edges, n):
+    sets = NodeSets()
+    cells = [array('i', [MISSING]) * (len(edges) - i)
+             for i in range(len(edges))]
 
     for i in range(len(edges)):
-        uf = UnionFind()
+        uf = UnionFind(track_members=True)
         for j, (u, v) in enumerate(edges[i:], i):
             uf.make_set(Edge(j))
             uf.make_set(Node(u))
@@ -63,20 +433,1536 @@ def process_graph(edge_lists, edges, node_names):
             if uf.connected(Edge(i), Edge(j)):
                 nodes = (v.x for v in uf.component(Edge(j))
                          if v.type == NODE)
-                components[i, j] = frozenset(nodes)
+                cells[i][j - i] = sets.intern(nodes_mask(nodes))
+    return IntervalComponents(edges, list(map(_cell_runs, cells)), sets)
+
+
+def components_incremental(edges, n):
+    '''
+    Compute the same table as components_reference with one sweep per start
+    index, keeping the node set of each component alive as a bitmask at its
+    union-find root and merging the masks on union.
+    '''
+    components = IntervalComponents(edges)
+    us, vs = edge_columns(edges)
+    components.rows.extend(_sweep_rows(us, vs, n, 0, len(edges),
+                                       components.sets))
+    return components
+
+
+def edge_columns(edges):
+    return (array('i', (u for u, v in edges)),
+            array('i', (v for u, v in edges)))
+
+
+def _suffix_nodes(edges):
+    '''
+    For every j the node set bitmask of edges[j:], and 0 for j = len(edges).
+    '''
+    active = [0] * (len(edges) + 1)
+    for j in range(len(edges) - 1, -1, -1):
+        u, v = edges[j]
+        active[j] = active[j + 1] | 1 << u | 1 << v
+    return active
+
+
+def _settled(mask, rest):
+    '''
+    Whether a component with node set `mask` can no longer change when the
+    remaining edges touch the nodes `rest`: it contains all of them, or
+    none of them.
+    '''
+    common = mask & rest
+    return common == rest or not common
+
+
+def _sweep_rows(us, vs, n, start, stop, sets):
+    m = len(us)
+    uf = ArrayUnionFind(0, n)
+    find = uf.find
+    singletons = [1 << x for x in range(n)]
+    masks = list(singletons)
+    active = _suffix_nodes(list(zip(us, vs)))
+
+    for i in range(start, stop):
+        a = us[i]
+        offsets, ids = row = Runs(array('i'), array('i'))
+        uf.reset()
+        masks[:] = singletons
+        for j in range(i, m):
+            ru, rv = find(us[j]), find(vs[j])
+            if ru != rv:
+                ra = find(a)
+                r = uf.union(ru, rv)
+                masks[r] = masks[ru] | masks[rv]
+                if ra == ru or ra == rv:
+                    offsets.append(j - i)
+                    ids.append(sets.intern(masks[r]))
+                    if _settled(masks[r], active[j + 1]):
+                        break
+            elif j == i:
+                # A self-loop still makes a component of its node
+                offsets.append(0)
+                ids.append(sets.intern(masks[ru]))
+        yield row
+
+
+class CSR(namedtuple('CSR', 'offsets neighbors weights')):
+    '''
+    Compressed sparse row adjacency: the neighbours of node x and the
+    weights (edge indices) of the edges to them are
+    neighbors[offsets[x]:offsets[x + 1]] and weights[...], sorted by
+    weight. This is the format in which the editor hands graphs to compute.
+
+    >>> csr = CSR.from_edges([(0, 1), (1, 2)], 3)
+    >>> list(csr.offsets), list(csr.neighbors), list(csr.weights)
+    ([0, 1, 3, 4], [1, 0, 2, 1], [0, 0, 1, 1])
+    >>> csr.edges()
+    [(0, 1), (1, 2)]
+    '''
+
+    @classmethod
+    def from_edge_lists(cls, edge_lists):
+        '''
+        Build from per-node lists of (neighbour, weight) pairs.
+        '''
+        offsets = array('i', [0])
+        neighbors = array('i')
+        weights = array('i')
+        for pairs in edge_lists:
+            for v, w in sorted(pairs, key=lambda p: p[1]):
+                neighbors.append(v)
+                weights.append(w)
+            offsets.append(len(neighbors))
+        return cls(offsets, neighbors, weights)
+
+    @classmethod
+    def from_edges(cls, edges, n):
+        edge_lists = [[] for _ in range(n)]
+        for j, (u, v) in enumerate(edges):
+            edge_lists[u].append((v, j))
+            edge_lists[v].append((u, j))
+        return cls.from_edge_lists(edge_lists)
+
+    @property
+    def n(self):
+        return len(self.offsets) - 1
+
+    def edges(self):
+        '''
+        The edge sequence, each edge as (smaller, larger) node index.
+        '''
+        edges = [None] * (len(self.neighbors) // 2)
+        offsets, neighbors, weights = self
+        for u in range(self.n):
+            for k in range(offsets[u], offsets[u + 1]):
+                if u < neighbors[k]:
+                    edges[weights[k]] = (u, neighbors[k])
+        return edges
+
+
+def components_search(edges, n, csr=None):
+    '''
+    Row sweep without union-find: the component of Edge(i) is grown by
+    graph search over the CSR adjacency, following only edges whose index
+    lies in the current window. Edge(j) can only grow the component when
+    it has exactly one endpoint in it, and then the search continues from
+    the other endpoint. Every node is expanded at most once per row, so a
+    row costs O(m) plus the interning, which favours sparse windows.
+    '''
+    if csr is None:
+        csr = CSR.from_edges(edges, n)
+    offsets, neighbors, weights = csr
+    m = len(edges)
+    components = IntervalComponents(edges)
+    active = _suffix_nodes(edges)
+    for i in range(m):
+        row = components.add_row()
+        mask = 0
+        for j in range(i, m):
+            u, v = edges[j]
+            if not mask or (mask >> u & 1) != (mask >> v & 1):
+                stack = [u, v]
+                while stack:
+                    x = stack.pop()
+                    if mask >> x & 1:
+                        continue
+                    mask |= 1 << x
+                    stop = offsets[x + 1]
+                    p = bisect_left(weights, i, offsets[x], stop)
+                    while p < stop and weights[p] <= j:
+                        if not mask >> neighbors[p] & 1:
+                            stack.append(neighbors[p])
+                        p += 1
+                row.offsets.append(j - i)
+                row.ids.append(components.sets.intern(mask))
+                if _settled(mask, active[j + 1]):
+                    break
+    return components
+
+
+def components_bitset(edges, n):
+    '''
+    Row sweep where every node is labelled with its component and every
+    component keeps its bitmask. Merging ORs the masks and relabels the
+    nodes of the smaller one, and a cell is a label comparison.
+    '''
+    m = len(edges)
+    components = IntervalComponents(edges)
+    identity = list(range(n))
+    singletons = [1 << x for x in identity]
+    ones = [1] * n
+    label, masks, sizes = list(identity), list(singletons), list(ones)
+    us, vs = edge_columns(edges)
+    active = _suffix_nodes(edges)
+
+    for i in range(m):
+        offsets, ids = components.add_row()
+        label[:], masks[:], sizes[:] = identity, singletons, ones
+        a = us[i]
+        for j in range(i, m):
+            u, v = us[j], vs[j]
+            cu, cv = label[u], label[v]
+            if cu != cv:
+                if sizes[cu] < sizes[cv]:
+                    cu, cv = cv, cu
+                for x in mask_nodes(masks[cv]):
+                    label[x] = cu
+                masks[cu] |= masks[cv]
+                sizes[cu] += sizes[cv]
+                if label[a] == cu:
+                    offsets.append(j - i)
+                    ids.append(components.sets.intern(masks[cu]))
+                    if _settled(masks[cu], active[j + 1]):
+                        break
+            elif j == i:
+                # A self-loop still makes a component of its node
+                offsets.append(0)
+                ids.append(components.sets.intern(masks[cu]))
+    return components
+
+
+def components_divide(edges, n):
+    '''
+    Answer every window by divide and conquer over the edge range on a
+    RollbackUnionFind. Windows inside one half are solved recursively;
+    windows crossing the midpoint grow their left part one edge at a time
+    and add and then undo the right part for each start index.
+    '''
+    sets = NodeSets()
+    cells = [array('i', [MISSING]) * (len(edges) - i)
+             for i in range(len(edges))]
+    uf = RollbackUnionFind(n)
+
+    def cross(lo, mid, hi):
+        base = uf.checkpoint()
+        for i in range(mid, lo - 1, -1):
+            uf.union(*edges[i])
+            left = uf.checkpoint()
+            a = edges[i][0]
+            row = cells[i]
+            k = MISSING
+            count = 0
+            for j in range(mid + 1, hi + 1):
+                u, v = edges[j]
+                uf.union(u, v)
+                if uf.connected(u, a):
+                    if uf.node_count(a) != count:
+                        count = uf.node_count(a)
+                        k = sets.intern(nodes_mask(uf.component(a)))
+                    row[j - i] = k
+            uf.rollback(left)
+        uf.rollback(base)
+
+    def solve(lo, hi):
+        if lo == hi:
+            cells[lo][0] = sets.intern(nodes_mask(edges[lo]))
+            return
+        mid = (lo + hi) // 2
+        solve(lo, mid)
+        solve(mid + 1, hi)
+        cross(lo, mid, hi)
+
+    if edges:
+        solve(0, len(edges) - 1)
+    return IntervalComponents(edges, list(map(_cell_runs, cells)), sets)
+
+
+def first_connection_table(edges, n):
+    '''
+    For every start index i, compute the index j at which each node first
+    becomes connected to Edge(i) in the window edges[i..j], or len(edges)
+    if it never does.
+
+    The rows are produced by a single pass over the edges in reverse order.
+    With edge indices as weights, the minimum spanning forest of edges[i:]
+    is the minimum spanning forest of edge i together with the forest of
+    edges[i+1:], so each row is a Kruskal pass over at most n edges, and
+    the union order of that pass gives the connection times directly.
+    '''
+    m = len(edges)
+    table = [None] * m
+    forest = []
+    uf = ArrayUnionFind(0, n, track_members=True)
+    for i in range(m - 1, -1, -1):
+        a = edges[i][0]
+        first = array('i', [m]) * n
+        first[a] = i
+        uf.reset()
+        next_forest = []
+        for j in [i] + forest:
+            u, v = edges[j]
+            ru, rv = uf.find(u), uf.find(v)
+            if ru == rv:
+                continue
+            next_forest.append(j)
+            ra = uf.find(a)
+            if ra in (ru, rv):
+                for x in uf.component(rv if ra == ru else ru):
+                    first[x] = j
+            uf.union(ru, rv)
+        forest = next_forest
+        table[i] = first
+    return table
+
+
+def spanning_forests(edges, n):
+    '''
+    The minimum spanning forest of edges[i:] for every start index i, with
+    edge indices as weights, as ascending arrays of edge indices. See
+    first_connection_table for the recurrence.
+    '''
+    kruskal = _Kruskal(edges, n)
+    forests = [None] * len(edges)
+    forest = array('i')
+    for i in range(len(edges) - 1, -1, -1):
+        forest, changes = kruskal.run(i, array('i', [i]) + forest)
+        forests[i] = forest
+    return forests
+
+
+class _Kruskal:
+    def __init__(self, edges, n):
+        self.edges = edges
+        self.uf = ArrayUnionFind(0, n)
+        self.singletons = [1 << x for x in range(n)]
+        self.masks = list(self.singletons)
+
+    def run(self, i, candidates):
+        '''
+        Run Kruskal's algorithm over the ascending candidate edge indices.
+        Return the accepted indices and the list of (j, mask) where the
+        component of Edge(i) grows to the node set `mask` at index j.
+        '''
+        uf, masks, edges = self.uf, self.masks, self.edges
+        uf.reset()
+        masks[:] = self.singletons
+        a = edges[i][0]
+        forest = array('i')
+        changes = []
+        for j in candidates:
+            u, v = edges[j]
+            ru, rv, ra = uf.find(u), uf.find(v), uf.find(a)
+            if ru == rv:
+                continue
+            forest.append(j)
+            r = uf.union(ru, rv)
+            masks[r] = masks[ru] | masks[rv]
+            if ra in (ru, rv):
+                changes.append((j, masks[r]))
+        if not changes or changes[0][0] != i:
+            # Edge(i) is a self-loop
+            changes.insert(0, (i, 1 << a))
+        return forest, changes
+
+
+class _Partition:
+    '''
+    Union-find over the nodes for the whole suffix of one start index,
+    kept alive between edits so that appending an edge is a single union.
+    Roots hold minus the size of their set, members are threaded on
+    circular `next` lists, and `top` is the node mask of the component of
+    node a, an endpoint of the start edge.
+    '''
+
+    __slots__ = ('parent', 'next', 'a', 'top')
+
+    def __init__(self, n, a):
+        self.parent = array('i', [-1]) * n
+        self.next = array('i', range(n))
+        self.a = a
+        self.top = 1 << a
+
+    def grow(self, n):
+        size = len(self.parent)
+        if n > size:
+            self.parent.extend(array('i', [-1]) * (n - size))
+            self.next.extend(range(size, n))
+
+    def find(self, u):
+        parent = self.parent
+        while parent[u] >= 0:
+            if parent[parent[u]] >= 0:
+                parent[u] = parent[parent[u]]
+            u = parent[u]
+        return u
+
+    def union(self, u, v):
+        '''
+        Join the sets of u and v and return whether they were disjoint.
+        '''
+        ru, rv, ra = self.find(u), self.find(v), self.find(self.a)
+        if ru == rv:
+            return False
+        if ra in (ru, rv):
+            other = rv if ra == ru else ru
+            self.top |= nodes_mask(_circular(self.next, other))
+        parent = self.parent
+        if parent[ru] > parent[rv]:
+            ru, rv = rv, ru
+        parent[ru] += parent[rv]
+        parent[rv] = ru
+        next = self.next
+        next[ru], next[rv] = next[rv], next[ru]
+        return True
+
+
+def _partition(edges, n, i, forest):
+    partition = _Partition(n, edges[i][0])
+    for j in forest:
+        partition.union(*edges[j])
+    return partition
+
+
+def _partitions(edges, n, forests):
+    return [_partition(edges, n, i, forest)
+            for i, forest in enumerate(forests)]
+
+
+def _row_runs(i, changes, sets):
+    return Runs(array('i', [j - i for j, mask in changes]),
+                array('i', [sets.intern(mask) for j, mask in changes]))
+
+
+def components_from_first_connection(edges, table):
+    m = len(edges)
+    components = IntervalComponents(edges)
+    for i, first in enumerate(table):
+        offsets, ids = components.add_row()
+        joined = sorted((j, x) for x, j in enumerate(first) if j < m)
+        mask = 0
+        for y, (j, x) in enumerate(joined):
+            mask |= 1 << x
+            if y + 1 == len(joined) or joined[y + 1][0] != j:
+                offsets.append(j - i)
+                ids.append(components.sets.intern(mask))
+    return components
+
+
+def components_offline(edges, n):
+    return components_from_first_connection(
+        edges, first_connection_table(edges, n))
+
+
+class WindowIndex:
+    '''
+    Connectivity queries on single windows edges[i..j] without computing
+    every cell. For each start index i the index keeps the positions at
+    which the component of Edge(i) grows, taken from the spanning forest of
+    edges[i:], so a query is a binary search in a row of at most n entries.
+
+    >>> index = WindowIndex([(0, 1), (2, 3), (1, 2), (3, 4)], 5)
+    >>> index.connected_in_window(0, 1), index.connected_in_window(0, 2)
+    (False, True)
+    >>> index.component_nodes(0, 1), index.component_nodes(1, 3)
+    ([0, 1], [1, 2, 3, 4])
+    '''
+
+    def __init__(self, edges, n, forests=None):
+        self.edges = edges
+        self.sets = NodeSets()
+        self.starts = [None] * len(edges)
+        self.ids = [None] * len(edges)
+        kruskal = _Kruskal(edges, n)
+        forest = array('i')
+        for i in range(len(edges) - 1, -1, -1):
+            if forests is None:
+                forest, changes = kruskal.run(i, array('i', [i]) + forest)
+            else:
+                forest, changes = kruskal.run(i, forests[i])
+            self.starts[i] = array('i', [j for j, mask in changes])
+            self.ids[i] = array('i', [self.sets.intern(mask)
+                                      for j, mask in changes])
+
+    def nbytes(self):
+        return (sum(8 * len(starts) + 160 for starts in self.starts) +
+                _masks_nbytes(self.sets))
+
+    def component_mask(self, i, j):
+        '''
+        Node set bitmask of the component containing Edge(i) in the window
+        edges[i..j].
+        '''
+        if not 0 <= i <= j < len(self.edges):
+            raise IndexError((i, j))
+        x = bisect_right(self.starts[i], j) - 1
+        return self.sets[self.ids[i][x]]
+
+    def component_nodes(self, i, j):
+        return list(mask_nodes(self.component_mask(i, j)))
+
+    def connected_in_window(self, i, j):
+        '''
+        Whether Edge(i) and Edge(j) are connected in the window edges[i..j],
+        that is, whether result[i, j] exists.
+        '''
+        return bool(self.component_mask(i, j) >> self.edges[j][0] & 1)
+
+
+class KruskalTree:
+    '''
+    Kruskal reconstruction tree of the edge sequence, with edge indices as
+    weights. The leaves are the nodes, and every edge that joins two
+    components of its prefix becomes an internal vertex whose children are
+    the roots of those components. The weights increase towards the
+    roots, so the prefix that first connects two nodes is the weight of
+    their lowest common ancestor, found by binary lifting.
+
+    Appending an edge adds at most one root; other edits rebuild the tree.
+
+    >>> tree = KruskalTree([(0, 1), (2, 3), (1, 2), (3, 4)], 5)
+    >>> tree.bottleneck(0, 3), tree.bottleneck(1, 4), tree.bottleneck(0, 0)
+    (2, 3, -1)
+    >>> tree.component_nodes(3, 1), tree.component_nodes(3, 2)
+    ([2, 3], [0, 1, 2, 3])
+    '''
+
+    def __init__(self, edges, n):
+        self._build(edges, n)
 
-    largest = {}
-    for size in range(len(edges), 0, -1):
-        for i in range(0, len(edges) - (size - 1)):
-            j = i + (size - 1)
+    def _build(self, edges, n):
+        self.edges = []
+        self.n = 0
+        # Tree vertices: parent (-1 for roots), weight (-1 for leaves) and
+        # node mask
+        self.parent = array('i')
+        self.weight = array('i')
+        self.masks = []
+        self.leaf = array('i')
+        # Union-find over the nodes, with the tree root of every set
+        self._uf = array('i')
+        self._root = array('i')
+        self._up = None
+        self._depth = None
+        self.grow(n)
+        for u, v in edges:
+            self.append(u, v)
+
+    def grow(self, n):
+        for x in range(self.n, n):
+            self.leaf.append(self._vertex(-1, 1 << x))
+            self._uf.append(x)
+            self._root.append(self.leaf[x])
+        self.n = max(self.n, n)
+
+    def _vertex(self, weight, mask):
+        self.parent.append(-1)
+        self.weight.append(weight)
+        self.masks.append(mask)
+        self._up = None
+        return len(self.parent) - 1
+
+    def _find(self, u):
+        uf = self._uf
+        while uf[u] != u:
+            uf[u] = u = uf[uf[u]]
+        return u
+
+    def append(self, u, v):
+        j = len(self.edges)
+        self.edges.append((u, v))
+        ru, rv = self._find(u), self._find(v)
+        if ru == rv:
+            return
+        a, b = self._root[ru], self._root[rv]
+        t = self._vertex(j, self.masks[a] | self.masks[b])
+        self.parent[a] = self.parent[b] = t
+        self._uf[ru] = rv
+        self._root[rv] = t
+
+    def update(self, edges, n, delta):
+        '''
+        Bring the tree up to date with `edges` after the edit `delta`.
+        '''
+        if isinstance(delta, Append) and list(edges[:-1]) == self.edges:
+            self.grow(n)
+            self.append(*edges[-1])
+        else:
+            self._build(edges, n)
+        return self
+
+    def nbytes(self):
+        vertices = len(self.parent)
+        tables = 0 if self._up is None else len(self._up) + 1
+        return (4 * vertices * (2 + tables) + 8 * self.n +
+                _masks_nbytes(self.masks) + 80 * len(self.edges))
+
+    def _lift(self):
+        if self._up is None:
+            parent = self.parent
+            size = len(parent)
+            depth = array('i', [0]) * size
+            # Parents are created after their children
+            for x in range(size - 1, -1, -1):
+                if parent[x] >= 0:
+                    depth[x] = depth[parent[x]] + 1
+            up = [array('i', (x if p < 0 else p
+                              for x, p in enumerate(parent)))]
+            while 1 << len(up) <= max(depth, default=0):
+                prev = up[-1]
+                up.append(array('i', (prev[p] for p in prev)))
+            self._up, self._depth = up, depth
+        return self._up, self._depth
+
+    def _lca(self, a, b, up, depth):
+        if depth[a] < depth[b]:
+            a, b = b, a
+        d = depth[a] - depth[b]
+        k = 0
+        while d:
+            if d & 1:
+                a = up[k][a]
+            d >>= 1
+            k += 1
+        if a == b:
+            return a
+        for k in range(len(up) - 1, -1, -1):
+            if up[k][a] != up[k][b]:
+                a, b = up[k][a], up[k][b]
+        return up[0][a]
+
+    def bottleneck(self, u, v):
+        '''
+        The smallest j such that u and v are connected by edges[0..j],
+        -1 if u == v, or None if they are never connected.
+        '''
+        if self._find(u) != self._find(v):
+            return None
+        up, depth = self._lift()
+        return self.weight[self._lca(self.leaf[u], self.leaf[v], up, depth)]
+
+    def bottlenecks(self, pairs):
+        '''
+        bottleneck(u, v) for every pair, sharing the lifting tables and
+        the root lookups across the batch.
+
+        >>> tree = KruskalTree([(0, 1), (2, 3), (1, 2), (3, 4)], 5)
+        >>> tree.bottlenecks([(0, 3), (1, 4), (0, 0), (4, 4)])
+        [2, 3, -1, -1]
+        >>> KruskalTree([(0, 1)], 3).bottlenecks([(0, 1), (1, 2)])
+        [0, None]
+        '''
+        up, depth = self._lift()
+        find, lca = self._find, self._lca
+        weight, leaf = self.weight, self.leaf
+        roots = {}
+        result = []
+        for u, v in pairs:
+            ru = roots.get(u)
+            if ru is None:
+                ru = roots[u] = find(u)
+            rv = roots.get(v)
+            if rv is None:
+                rv = roots[v] = find(v)
+            if ru != rv:
+                result.append(None)
+            else:
+                result.append(weight[lca(leaf[u], leaf[v], up, depth)])
+        return result
+
+    def component_mask(self, u, j):
+        '''
+        Node set bitmask of the component of u in the prefix edges[0..j].
+        '''
+        up, depth = self._lift()
+        weight = self.weight
+        x = self.leaf[u]
+        for k in range(len(up) - 1, -1, -1):
+            if weight[up[k][x]] <= j:
+                x = up[k][x]
+        return self.masks[x]
+
+    def component_nodes(self, u, j):
+        return list(mask_nodes(self.component_mask(u, j)))
+
+
+def components_parallel(edges, n, workers=None):
+    '''
+    Run the incremental sweep with the start indices sharded across a
+    process pool.
+
+    The edges are packed into a shared int32 buffer that workers map
+    without copying. Workers return the runs of their rows with locally
+    interned set ids together with their node set tables, and the rows
+    are translated to shared set ids in start-index order.
+    '''
+    m = len(edges)
+    components = IntervalComponents(edges)
+    workers = workers or os.cpu_count()
+    bounds = _balanced_chunks(m, 4 * workers)
+    edge_shm = _shared_ints(2 * m)
+    try:
+        with edge_shm.buf.cast('i') as columns:
+            columns[:m], columns[m:2 * m] = edge_columns(edges)
+        with ProcessPoolExecutor(
+                workers, initializer=_attach_worker,
+                initargs=(edge_shm.name, m, n)) as pool:
+            for rows, sets in pool.map(_worker_rows, bounds[:-1], bounds[1:]):
+                remap = array('i', map(components.sets.intern, sets))
+                components.rows.extend(
+                    Runs(offsets, array('i', map(remap.__getitem__, ids)))
+                    for offsets, ids in rows)
+    finally:
+        edge_shm.close()
+        edge_shm.unlink()
+    return components
+
+
+def _shared_ints(size):
+    return shared_memory.SharedMemory(create=True, size=4 * max(size, 1))
+
+
+def _balanced_chunks(m, chunks):
+    # Row i has m - i cells, so cut where the remaining cell count drops
+    # below each multiple of total / chunks.
+    total = m * (m + 1) // 2
+    bounds = [0]
+    remaining = total
+    for i in range(m):
+        remaining -= m - i
+        if remaining <= total * (chunks - len(bounds)) / chunks:
+            bounds.append(i + 1)
+    if bounds[-1] != m:
+        bounds.append(m)
+    return bounds
+
+
+_worker_state = None
+
+
+def _attach_worker(edge_name, m, n):
+    global _worker_state
+    _worker_state = (shared_memory.SharedMemory(edge_name), m, n)
+
+
+def _worker_rows(start, stop):
+    edge_shm, m, n = _worker_state
+    sets = NodeSets()
+    with edge_shm.buf.cast('i') as columns:
+        rows = list(_sweep_rows(columns[:m], columns[m:2 * m], n, start,
+                                stop, sets))
+    return rows, list(sets)
+
+
+ENGINES = {
+    'reference': components_reference,
+    'incremental': components_incremental,
+    'offline': components_offline,
+    'divide': components_divide,
+    'bitset': components_bitset,
+    'parallel': components_parallel,
+    'search': components_search,
+}
+
+
+class Missing(namedtuple('Missing', 'i j')):
+    def format(self, node_names):
+        return '%s,%s' % self
+
+
+class Duplicate(namedtuple('Duplicate', 'i j ri rj')):
+    def format(self, node_names):
+        return '%s,%s = %s,%s' % self
+
+
+class Largest(namedtuple('Largest', 'i j mask')):
+    def format(self, node_names):
+        return '%s,%s = %s' % (self.i, self.j,
+                               mask_names(self.mask, node_names))
+
+
+class Result:
+    '''
+    Outcome of a computation over the edge sequence `edges` on `n` nodes.
+
+    result[i, j] is the node set bitmask of the component containing
+    Edge(i) and Edge(j) in the window edges[i..j], or KeyError if they are
+    not connected. The representatives and first connection rows are
+    computed on first use.
+    '''
+
+    def __init__(self, edges, n, components, forests=None,
+                 partitions=None):
+        self.edges = edges
+        self.n = n
+        self.components = components
+        self._forests = forests
+        self._partitions = partitions
+        self._representatives = None
+        self._first = {}
+        self._window_index = None
+        self._kruskal_tree = None
+
+    @property
+    def sets(self):
+        return self.components.sets
+
+    def __getitem__(self, key):
+        return self.components[key]
+
+    def set_id(self, i, j):
+        return self.components.set_id(i, j)
+
+    def representatives(self):
+        '''
+        For every set id, the widest window having that node set, with ties
+        going to the smallest start index.
+        '''
+        if self._representatives is None:
+            edges, sets = self.edges, self.sets
+            m = len(edges)
+            reps = [None] * len(sets)
+            sizes = [0] * len(sets)
+            for i, (offsets, ids) in enumerate(self.components.rows):
+                stops = offsets[1:] + array('i', [m - i])
+                for start, stop, k in zip(offsets, stops, ids):
+                    # The widest window of the run whose end edge is
+                    # connected; the first window of a run always is
+                    x = stop - 1
+                    mask = sets[k]
+                    while not mask >> edges[i + x][0] & 1:
+                        x -= 1
+                    if x + 1 > sizes[k]:
+                        sizes[k] = x + 1
+                        reps[k] = (i, i + x)
+            self._representatives = reps
+        return self._representatives
+
+    def representative(self, i, j):
+        k = self.set_id(i, j)
+        return None if k == MISSING else self.representatives()[k]
+
+    def first_connection(self, i):
+        '''
+        The index at which each node joins the component of Edge(i) as the
+        window edges[i..j] grows, or len(edges) if it never does.
+        '''
+        try:
+            return self._first[i]
+        except KeyError:
+            pass
+        m = len(self.edges)
+        first = array('i', [m]) * self.n
+        seen = 0
+        offsets, ids = self.components.rows[i]
+        for x, k in zip(offsets, ids):
+            for node in mask_nodes(self.sets[k] & ~seen):
+                first[node] = i + x
+            seen = self.sets[k]
+        self._first[i] = first
+        return first
+
+    def nbytes(self):
+        '''
+        Rough memory footprint, for caching: the runs and node sets, and
+        the forests, partitions and query indexes that have been built.
+        '''
+        rows = self.components.rows
+        size = (sum(len(offsets) for offsets, ids in rows) * 8 +
+                192 * len(rows) + _masks_nbytes(self.sets))
+        if self._forests is not None:
+            size += sum(4 * len(forest) + 80 for forest in self._forests)
+        if self._partitions is not None:
+            size += sum(8 * len(partition.parent) + 300
+                        for partition in self._partitions)
+        for index in (self._window_index, self._kruskal_tree):
+            if index is not None:
+                size += index.nbytes()
+        return size
+
+    def forests(self):
+        if self._forests is None:
+            self._forests = spanning_forests(self.edges, self.n)
+        return self._forests
+
+    def partitions(self):
+        if self._partitions is None:
+            self._partitions = _partitions(self.edges, self.n,
+                                           self.forests())
+        return self._partitions
+
+    def window_index(self):
+        if self._window_index is None:
+            self._window_index = WindowIndex(self.edges, self.n,
+                                             self.forests())
+        return self._window_index
+
+    def kruskal_tree(self):
+        if self._kruskal_tree is None:
+            self._kruskal_tree = KruskalTree(self.edges, self.n)
+        return self._kruskal_tree
+
+    def _cells_by_size(self):
+        m = len(self.edges)
+        rows = self.components.rows
+        masks = list(self.sets)
+        us = [u for u, v in self.edges]
+        # The run of each row holding the current cell, and where it starts;
+        # the cells of a row are visited from the right, so it moves left
+        runs = [len(offsets) - 1 for offsets, ids in rows]
+        starts = [offsets[-1] for offsets, ids in rows]
+        for size in range(m, 0, -1):
+            x = size - 1
+            for i in range(0, m - x):
+                if starts[i] > x:
+                    offsets = rows[i].offsets
+                    r = runs[i] - 1
+                    while offsets[r] > x:
+                        r -= 1
+                    runs[i] = r
+                    starts[i] = offsets[r]
+                k = rows[i].ids[runs[i]]
+                yield i, i + x, k if masks[k] >> us[i + x] & 1 else MISSING
+
+    def records(self):
+        '''
+        Generate one record per window, widest windows first: Missing if
+        the end edges are not connected, Largest for the representative
+        window of a node set, and Duplicate pointing back to it otherwise.
+        '''
+        reps = self.representatives()
+        for i, j, k in self._cells_by_size():
+            if k == MISSING:
+                yield Missing(i, j)
+            elif reps[k] != (i, j):
+                yield Duplicate(i, j, *reps[k])
+            else:
+                yield Largest(i, j, self.sets[k])
+
+    def render(self, node_names, sink=None, cancelled=None):
+        '''
+        Write the records to `sink`, by default stdout in the text format.
+        If given, `cancelled` is polled every few thousand records and
+        rendering stops with Cancelled once it returns true.
+        '''
+        if sink is None:
+            sink = TextSink(sys.stdout, node_names)
+        try:
+            for x, record in enumerate(self.records()):
+                if cancelled is not None and x % 4096 == 0 and cancelled():
+                    raise Cancelled()
+                sink.write(record)
+        finally:
+            sink.close()
+
+
+class Cancelled(Exception):
+    pass
+
+
+class TextSink:
+    '''
+    Write records in the process_graph text format to a file, collecting
+    lines and writing them `batch` at a time.
+    '''
+
+    def __init__(self, file, node_names, batch=4096):
+        self.file = file
+        self.node_names = node_names
+        self.batch = batch
+        self._lines = []
+
+    def format(self, record):
+        return record.format(self.node_names)
+
+    def write(self, record):
+        self._lines.append(self.format(record))
+        if len(self._lines) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if self._lines:
+            self.file.write('\n'.join(self._lines) + '\n')
+            self._lines.clear()
+
+    def close(self):
+        self.flush()
+
+
+class TSVSink(TextSink):
+    '''
+    Tab-separated records with the columns i, j, ri, rj, nodes, where ri, rj
+    is the widest window with the same node set and nodes is empty unless
+    (i, j) is that window. Missing windows leave ri, rj empty.
+    '''
+
+    def format(self, record):
+        if isinstance(record, Missing):
+            columns = record + ('', '', '')
+        elif isinstance(record, Duplicate):
+            columns = record + ('',)
+        else:
+            columns = (record.i, record.j, record.i, record.j,
+                       mask_names(record.mask, self.node_names))
+        return '\t'.join(map(str, columns))
+
+
+class ListSink:
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+    def close(self):
+        pass
+
+
+class CallbackSink:
+    def __init__(self, callback):
+        self.callback = callback
+
+    def write(self, record):
+        self.callback(record)
+
+    def close(self):
+        pass
+
+
+def compute_result(edges, n, engine=None, csr=None):
+    '''
+    Compute the Result for `edges` with the given engine. `csr` is the
+    CSR adjacency of `edges`, if the caller has it, for the search engine.
+    '''
+    if engine is None:
+        # Graph search wins while windows are sparse; on random graphs the
+        # two cross over at about as many edges as nodes.
+        engine = 'search' if len(edges) < n else 'bitset'
+    fn = ENGINES[engine]
+    if fn is components_search and csr is not None:
+        fn = partial(fn, csr=csr)
+    return Result(edges, n, fn(edges, n))
+
+
+Swap = namedtuple('Swap', 'i')
+Append = namedtuple('Append', '')
+Delete = namedtuple('Delete', 'k')
+
+
+def apply_delta(edges, delta):
+    '''
+    The edge sequence after a Swap(i), which exchanges positions i and
+    i + 1, or a Delete(k), which removes position k. An Append() has no
+    edge of its own; the new edge is the last one of the new sequence.
+
+    >>> apply_delta([(0, 1), (1, 2), (2, 0)], Swap(1))
+    [(0, 1), (2, 0), (1, 2)]
+    >>> apply_delta([(0, 1), (1, 2), (2, 0)], Delete(0))
+    [(1, 2), (2, 0)]
+    '''
+    edges = list(edges)
+    if isinstance(delta, Swap):
+        edges[delta.i], edges[delta.i + 1] = edges[delta.i + 1], edges[delta.i]
+    elif isinstance(delta, Delete):
+        del edges[delta.k]
+    else:
+        raise ValueError(delta)
+    return edges
+
+
+def update_result(previous, edges, n, delta, engine=None):
+    '''
+    Compute the Result for `edges` from the Result for the edge sequence
+    before the edit `delta`, recomputing only what the edit can change.
+    Falls back to compute_result if `previous` does not match.
+
+    Windows are recomputed from the spanning forests of the previous
+    result (see spanning_forests): after an edit, the forest of each
+    suffix is contained in the old forest plus the edited edges, so an
+    affected row costs a Kruskal pass over at most n + 1 edges.
+
+    `previous` stays valid, so it can be edited again later, as happens
+    when the caches hand it back:
+
+    >>> edges = [(0, 1), (1, 2), (2, 3), (3, 4), (0, 4), (1, 3), (2, 4)]
+    >>> a = compute_result(edges, 5)
+    >>> b = update_result(a, apply_delta(edges, Swap(0)), 5, Swap(0))
+    >>> c = update_result(b, b.edges + [(0, 5)], 6, Append())
+    >>> list(c.records()) == list(compute_result(c.edges, 6).records())
+    True
+    >>> d = update_result(a, apply_delta(edges, Swap(5)), 5, Swap(5))
+    >>> list(d.records()) == list(compute_result(d.edges, 5).records())
+    True
+
+    A Kruskal tree built for `previous` is updated and moves to the new
+    result:
+
+    >>> tree = c.kruskal_tree()
+    >>> e = update_result(c, c.edges + [(5, 6)], 7, Append())
+    >>> e.kruskal_tree() is tree, tree.bottleneck(0, 6)
+    (True, 8)
+    '''
+    old = previous.edges
+    if isinstance(delta, Append):
+        expected = list(old) + list(edges[-1:])
+    elif (isinstance(delta, Swap) and 0 <= delta.i < len(old) - 1 or
+          isinstance(delta, Delete) and 0 <= delta.k < len(old)):
+        expected = apply_delta(old, delta)
+    else:
+        expected = None
+    if previous.n > n or expected != list(edges):
+        return compute_result(edges, n, engine)
+
+    update = {Swap: _update_swap, Append: _update_append,
+              Delete: _update_delete}[type(delta)]
+    result = update(previous, edges, n, delta)
+    # Every update interns into its own copy of the node sets, which keeps
+    # the sets only older results use; drop them once they could outnumber
+    # the runs.
+    components = result.components
+    if len(components.sets) > 2 * sum(len(ids) for offsets, ids in
+                                      components.rows):
+        components.compact()
+    tree = previous._kruskal_tree
+    if tree is not None:
+        # The tree is updated in place, so it changes hands.
+        previous._kruskal_tree = None
+        result._kruskal_tree = tree.update(edges, n, delta)
+    return result
+
+
+def _take_partitions(previous):
+    '''
+    Hand the partitions of `previous`, if it has any, over to a new result;
+    they are updated in place.
+    '''
+    partitions = previous._partitions
+    previous._partitions = None
+    return partitions
+
+
+def _update_swap(previous, edges, n, delta):
+    '''
+    Rows p and p + 1 are recomputed by a Kruskal pass each. In a row
+    i < p only the window edges[i..p] changes, so one sweep over the
+    windows edges[i..p-1] for decreasing i gives the new cell and forest
+    edges of every such row. The spanning forests are patched if
+    `previous` has them, and are not needed otherwise.
+    '''
+    p = delta.i
+    m = len(edges)
+    kruskal = _Kruskal(edges, n)
+    sets = previous.sets.copy()
+    rows = list(previous.components.rows)
+    forests = previous._forests
+    if forests is not None:
+        forests = list(forests)
+    partitions = _take_partitions(previous)
+    # Rows after p + 1 do not contain either edge.
+    for i in (p + 1, p):
+        if forests is None:
+            candidates = range(i, m)
+        else:
+            tail = forests[i + 1] if i + 1 < m else array('i')
+            candidates = array('i', [i]) + tail
+        forest, changes = kruskal.run(i, candidates)
+        rows[i] = _row_runs(i, changes, sets)
+        if forests is not None:
+            forests[i] = forest
+        if partitions is not None:
+            partitions[i] = _partition(edges, n, i, forest)
+    # Union-find over the nodes of the window edges[i..p-1]. The
+    # partitions of rows before p cover the same edges as before.
+    uf = ArrayUnionFind(0, n)
+    find = uf.find
+    masks = [1 << x for x in range(n)]
+    f0, f1 = edges[p]
+    e0, e1 = edges[p + 1]
+    for i in range(p - 1, -1, -1):
+        u, v = edges[i]
+        ru, rv = find(u), find(v)
+        if ru != rv:
+            r = uf.union(ru, rv)
+            masks[r] = masks[ru] | masks[rv]
+        ra, rf0, rf1 = find(u), find(f0), find(f1)
+        if rf0 != rf1 and ra in (rf0, rf1):
+            mask = masks[rf0] | masks[rf1]
+        else:
+            mask = masks[ra]
+        x = p - i
+        offsets, ids = row = rows[i]
+        if sets[ids[bisect_right(offsets, x) - 1]] != mask:
+            rows[i] = _set_cell(row, x, sets.intern(mask))
+        if forests is not None:
+            # Edge p joins the forest if its endpoints are apart in the
+            # window, and edge p + 1 if neither the window nor edge p
+            # connects its endpoints.
+            re0, re1 = find(e0), find(e1)
+            accepted = array('i')
+            if rf0 != rf1:
+                accepted.append(p)
+            if re0 != re1 and not (rf0 != rf1 and
+                                   {re0, re1} == {rf0, rf1}):
+                accepted.append(p + 1)
+            forest = forests[i]
+            lo = bisect_left(forest, p)
+            hi = bisect_left(forest, p + 2)
+            if forest[lo:hi] != accepted:
+                forests[i] = forest[:lo] + accepted + forest[hi:]
+    return Result(edges, n, IntervalComponents(edges, rows, sets), forests,
+                  partitions)
+
+
+def _set_cell(row, x, k):
+    '''
+    The runs of `row` with the window at offset x, neither the first nor
+    the last of the row, changed to the node set with id k.
+    '''
+    offsets, ids = row
+    lo = bisect_left(offsets, x)
+    hi = bisect_right(offsets, x + 1)
+    cells = [(x, k), (x + 1, ids[hi - 1])]
+    new_offsets, new_ids = offsets[:lo], ids[:lo]
+    for y, c in cells:
+        if new_ids[-1] != c:
+            new_offsets.append(y)
+            new_ids.append(c)
+    return Runs(new_offsets + offsets[hi:], new_ids + ids[hi:])
+
+
+def _update_append(previous, edges, n, delta):
+    '''
+    Append the new last edge with one union per row in the partitions
+    kept by `previous`, which are handed over to the new result. The
+    forest arrays may be shared with other results, so grown forests are
+    new arrays.
+    '''
+    m = len(edges)
+    sets = previous.sets.copy()
+    rows = list(previous.components.rows)
+    forests = list(previous.forests())
+    partitions = previous.partitions()
+    previous._partitions = None
+    u, v = edges[m - 1]
+    for i in range(m - 1):
+        partition = partitions[i]
+        partition.grow(n)
+        if partition.union(u, v):
+            forests[i] = forests[i] + array('i', [m - 1])
+        offsets, ids = rows[i]
+        if partition.top != sets[ids[-1]]:
+            rows[i] = Runs(offsets + array('i', [m - 1 - i]),
+                           ids + array('i', [sets.intern(partition.top)]))
+    partition = _Partition(n, u)
+    partition.union(u, v)
+    forests.append(array('i', [m - 1]))
+    partitions.append(partition)
+    rows.append(Runs(array('i', [0]),
+                     array('i', [sets.intern(partition.top)])))
+    return Result(edges, n, IntervalComponents(edges, rows, sets), forests,
+                  partitions)
+
+
+def _update_delete(previous, edges, n, delta):
+    k = delta.k
+    m = len(edges)
+    kruskal = _Kruskal(edges, n)
+    sets = previous.sets.copy()
+    old_rows = previous.components.rows
+    old_forests = previous.forests()
+    rows = old_rows[:k] + old_rows[k + 1:]
+    partitions = _take_partitions(previous)
+    if partitions is not None:
+        # Rows from k on have the suffixes of the rows after k.
+        del partitions[k]
+    forests = [None] * m
+    for i in range(k, m):
+        forests[i] = array('i', [j - 1 for j in old_forests[i + 1]])
+    for i in range(k - 1, -1, -1):
+        if k in old_forests[i]:
+            # Edge k was needed to connect the suffix; rebuild the row.
+            tail = forests[i + 1] if i + 1 < m else array('i')
+            forests[i], changes = kruskal.run(i, array('i', [i]) + tail)
+            rows[i] = _row_runs(i, changes, sets)
+            if partitions is not None:
+                partitions[i] = _partition(edges, n, i, forests[i])
+        else:
+            # Edge k closed a cycle in every window containing it, so no
+            # run starts there.
+            forests[i] = array('i', [j - (j > k) for j in old_forests[i]])
+            offsets, ids = old_rows[i]
+            rows[i] = Runs(array('i', [x - (i + x > k) for x in offsets]),
+                           ids)
+    return Result(edges, n, IntervalComponents(edges, rows, sets), forests,
+                  partitions)
+
+
+def edges_digest(edges, n):
+    '''
+    Stable digest of an edge sequence on n nodes.
+
+    >>> edges_digest([(0, 1), (1, 2)], 3) == edges_digest([(0, 1), (1, 2)], 3)
+    True
+    >>> edges_digest([(0, 1), (1, 2)], 3) == edges_digest([(1, 2), (0, 1)], 3)
+    False
+    '''
+    data = array('i', [n])
+    for u, v in edges:
+        data.append(u)
+        data.append(v)
+    return hashlib.sha256(data.tobytes()).hexdigest()
+
+
+class ResultCache:
+    '''
+    Least recently used Results keyed by edges_digest, evicting the oldest
+    entries once the estimated size of the cached results exceeds
+    max_bytes.
+    '''
+
+    def __init__(self, max_bytes=256 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.hits = self.misses = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, edges, n):
+        key = edges_digest(edges, n)
+        try:
+            result = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, result):
+        key = edges_digest(result.edges, result.n)
+        self._entries.pop(key, None)
+        self._entries[key] = result
+        # Measure every entry again, since results grow as their forests
+        # and query indexes are built on use.
+        sizes = {k: r.nbytes() for k, r in self._entries.items()}
+        self.nbytes = sum(sizes.values())
+        while self.nbytes > self.max_bytes and len(self._entries) > 1:
+            self.nbytes -= sizes[self._entries.popitem(last=False)[0]]
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+
+cache = ResultCache()
+
+
+# Bump when a change to the engines changes what they compute, or when the
+# result file format changes.
+COMPUTE_VERSION = 2
+
+_RESULT_MAGIC = b'GRPH'
+_RESULT_HEADER = struct.Struct('<4sIIII')
+
+
+def _little_endian(ints):
+    if sys.byteorder == 'big':
+        ints = array('i', ints)
+        ints.byteswap()
+    return ints
+
+
+def dump_result(result, fp):
+    '''
+    Write the edges, node sets and cells of a Result to a binary file:
+    a header, the edges as int32 pairs, every node set mask as n bits
+    rounded up to whole bytes, and for every row its number of runs
+    followed by the run offsets and set ids, all as int32.
+    '''
+    m, n = len(result.edges), result.n
+    width = (n + 7) // 8
+    fp.write(_RESULT_HEADER.pack(_RESULT_MAGIC, COMPUTE_VERSION, m, n,
+                                 len(result.sets)))
+    fp.write(_little_endian(array('i', (x for e in result.edges for x in e)))
+             .tobytes())
+    fp.write(b''.join(mask.to_bytes(width, 'little') for mask in result.sets))
+    for offsets, ids in result.components.rows:
+        fp.write(_little_endian(array('i', [len(offsets)])).tobytes())
+        fp.write(_little_endian(offsets).tobytes())
+        fp.write(_little_endian(ids).tobytes())
+
+
+def load_result(fp):
+    '''
+    Read a Result written by dump_result.
+
+    >>> import io
+    >>> fp = io.BytesIO()
+    >>> dump_result(compute_result([], 0), fp)
+    >>> _ = fp.seek(0)
+    >>> result = load_result(fp)
+    >>> result.edges, result.n
+    ([], 0)
+    '''
+    magic, version, m, n, count = _RESULT_HEADER.unpack(
+        fp.read(_RESULT_HEADER.size))
+    if magic != _RESULT_MAGIC or version != COMPUTE_VERSION:
+        raise ValueError('Not a result file of this version')
+    width = (n + 7) // 8
+    flat = _read_ints(fp, 2 * m)
+    edges = list(zip(flat[0::2], flat[1::2]))
+    components = IntervalComponents(edges)
+    masks = fp.read(count * width)
+    for o in range(0, count * width, width or 1):
+        components.sets.intern(int.from_bytes(masks[o:o + width], 'little'))
+    for i in range(m):
+        runs, = _read_ints(fp, 1)
+        components.rows.append(Runs(_read_ints(fp, runs),
+                                    _read_ints(fp, runs)))
+    return Result(edges, n, components)
+
+
+def _read_ints(fp, count):
+    ints = array('i')
+    data = fp.read(4 * count)
+    if len(data) != 4 * count:
+        raise ValueError('Truncated result file')
+    ints.frombytes(data)
+    return _little_endian(ints)
+
+
+class DiskCache:
+    '''
+    Results stored as files named by edges_digest and COMPUTE_VERSION
+    under `path`, by default ~/.cache/graphing. Files are written to a
+    temporary name and renamed into place, and the least recently used
+    files are removed once the directory holds more than max_bytes.
+    Temporary files older than tmp_max_age seconds are left over from
+    interrupted writes and are always removed.
+    '''
+
+    def __init__(self, path=None, max_bytes=2 ** 30, tmp_max_age=3600):
+        if path is None:
+            base = (os.environ.get('XDG_CACHE_HOME') or
+                    os.path.join(os.path.expanduser('~'), '.cache'))
+            path = os.path.join(base, 'graphing')
+        self.path = path
+        self.max_bytes = max_bytes
+        self.tmp_max_age = tmp_max_age
+        self.hits = self.misses = 0
+
+    def filename(self, edges, n):
+        return os.path.join(self.path, '%s.v%s' % (edges_digest(edges, n),
+                                                   COMPUTE_VERSION))
+
+    def get(self, edges, n):
+        filename = self.filename(edges, n)
+        try:
+            with open(filename, 'rb') as fp:
+                result = load_result(fp)
+            os.utime(filename)
+        except (OSError, ValueError, struct.error):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def put(self, result):
+        filename = self.filename(result.edges, result.n)
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
             try:
-                comp = components[i, j]
-            except KeyError:
-                print('%s,%s' % (i, j))
+                with os.fdopen(fd, 'wb') as fp:
+                    dump_result(result, fp)
+                os.replace(tmp, filename)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+            self.evict()
+        except OSError:
+            pass
+
+    def evict(self):
+        entries = []
+        total = 0
+        stale = time.time() - self.tmp_max_age
+        for entry in os.scandir(self.path):
+            if not entry.is_file():
+                continue
+            st = entry.stat()
+            if not entry.name.endswith('.tmp'):
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+            elif st.st_mtime < stale:
+                # Left behind by a writer that died before os.replace.
+                self._unlink(entry.path)
             else:
-                ri, rj = largest.setdefault(comp, (i, j))
-                if (ri, rj) != (i, j):
-                    print('%s,%s = %s,%s' % (i, j, ri, rj))
-                else:
-                    print('%s,%s = %s' %
-                          (i, j, ''.join(sorted(node_names[i] for i in comp))))
+                total += st.st_size
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._unlink(path)
+            total -= size
+
+    def _unlink(self, path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+disk_cache = DiskCache()
+
+
+def get_result(edges, n, engine=None, previous=None, delta=None, csr=None):
+    '''
+    The Result for `edges` on n nodes, from the caches if possible, else
+    updated from `previous` by `delta` if given, else computed.
+    An explicit engine bypasses the caches so engines can be compared.
+    '''
+    caches = [c for c in (cache, disk_cache)
+              if c is not None and engine is None]
+    for i, c in enumerate(caches):
+        result = c.get(edges, n)
+        if result is not None:
+            for earlier in caches[:i]:
+                earlier.put(result)
+            return result
+    if previous is not None and delta is not None:
+        result = update_result(previous, edges, n, delta, engine)
+    else:
+        result = compute_result(edges, n, engine, csr)
+    for c in caches:
+        c.put(result)
+    return result
+
+
+def process_graph(csr, node_names, engine=None, sink=None, previous=None,
+                  delta=None, cancelled=None):
+    '''
+    Print the report for the graph with CSR adjacency `csr`.
+    '''
+    edges = csr.edges()
+    print('process_graph, %s edges, hash(edges)=%s, hash(weights)=%s' %
+          (len(edges), hash(frozenset(edges)), hash(tuple(edges))))
+
+    result = get_result(edges, len(node_names), engine, previous, delta,
+                        csr)
+    try:
+        result.render(node_names, sink, cancelled)
+    except Cancelled:
+        print('process_graph: report cancelled')
+    return result
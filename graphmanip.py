@@ -1,7 +1,10 @@
+import os
 import math
+import time
 import string
 import tkinter
 import importlib
+import threading
 import traceback
 import contextlib
 from math import pi as PI
@@ -21,9 +24,10 @@ class Node:
     MOVING_COLOR = (0.7, 1.0, 0.7, 1)
     ADDING_EDGE_COLOR = (1, 1, 0.7, 1)
 
-    def __init__(self, x, y, r, name):
+    def __init__(self, x, y, r, name, index):
         self.x, self.y, self.r = x, y, r
         self.name = name
+        self.index = index
         self.fill_color = self.FILL_COLOR
 
     def render(self, context: cairo.Context):
@@ -66,12 +70,13 @@ class Edge:
     FONT_SIZE = 13
 
     def __init__(self, u, v, w):
-        u, v = min(u, v, key=id), max(u, v, key=id)
+        if u.index > v.index:
+            u, v = v, u
         self.u, self.v, self.w = u, v, w
 
     @property
     def endpoint_ids(self):
-        return (id(self.u), id(self.v))
+        return (self.u.index, self.v.index)
 
     def render(self, context: cairo.Context):
         context.move_to(self.u.x, self.u.y)
@@ -164,8 +169,93 @@ def name_from_index(i):
     return ''.join(reversed(s))
 
 
+class ComputeWorker:
+    '''
+    Run fn(requests, previous, cancelled) on a background thread, where
+    requests are all those submitted since the previous run, in order, and
+    previous is what that run returned. Submitting a request makes
+    cancelled() of the current run return True; it is up to fn to check
+    it, so a run that does not is always finished.
+    '''
+
+    def __init__(self, fn):
+        self.fn = fn
+        self._requests = []
+        self._submitted = 0
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, *requests):
+        with self._cond:
+            self._requests.extend(requests)
+            self._submitted += 1
+            self._cond.notify()
+
+    def _run(self):
+        previous = None
+        while True:
+            with self._cond:
+                while not self._requests:
+                    self._cond.wait()
+                requests, self._requests = self._requests, []
+                generation = self._submitted
+
+            def cancelled():
+                return self._submitted != generation
+
+            try:
+                previous = self.fn(requests, previous, cancelled)
+            except Exception:
+                previous = None
+                traceback.print_exc()
+
+
+class RecomputeScheduler:
+    '''
+    Coalesce bursts of requests into one call of `fn` on the Tk loop of
+    `widget`: the call happens once no request has arrived for `quiet`
+    milliseconds, but no later than `max_latency` milliseconds after the
+    first request of the burst.
+    '''
+
+    def __init__(self, widget, fn, quiet=100, max_latency=500):
+        self.widget = widget
+        self.fn = fn
+        self.quiet = quiet
+        self.max_latency = max_latency
+        self.requested = self.executed = 0
+        self._after_id = None
+        self._first = None
+
+    def request(self):
+        self.requested += 1
+        now = time.monotonic()
+        if self._first is None:
+            self._first = now
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+        remaining = self.max_latency - 1000 * (now - self._first)
+        delay = max(0, min(self.quiet, remaining))
+        self._after_id = self.widget.after(int(delay), self._fire)
+
+    def _fire(self):
+        self._after_id = self._first = None
+        self.executed += 1
+        self.fn()
+
+
 class GraphManipulator(InteractiveSurface):
     NODE_RADIUS = 10
+    # Path of a file that receives the compute report instead of stdout
+    REPORT_FILE = None
+    # Reload compute.py when it changes on disk; set to False to keep the
+    # module, and with it the module-level caches, for the whole session
+    RELOAD_COMPUTE = True
+    # Milliseconds without edits before recomputing, and the longest an
+    # edit may wait for its recomputation during a burst of edits
+    RECOMPUTE_QUIET = 100
+    RECOMPUTE_MAX_LATENCY = 500
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -173,6 +263,16 @@ class GraphManipulator(InteractiveSurface):
         self.nodes = []
         self.edges = {}
         self.edge_by_weight = []
+        # Kept in step with the edits for handing to compute: names by
+        # node index, and for each node its (neighbour, weight) pairs
+        self.node_names = []
+        self.edge_lists = []
+        self.compute_loaded = self.compute_mtime()
+        self.worker = ComputeWorker(self.run_compute)
+        self.scheduler = RecomputeScheduler(
+            self, self.submit_compute, self.RECOMPUTE_QUIET,
+            self.RECOMPUTE_MAX_LATENCY)
+        self.pending_edits = []
 
         self.event_handler.update({
             (EventType.ButtonPress, 1): self.on_left_pressed,
@@ -203,8 +303,11 @@ class GraphManipulator(InteractiveSurface):
                 return closest
 
     def add_node(self, x, y):
-        n = Node(x, y, self.NODE_RADIUS, name_from_index(len(self.nodes)))
+        i = len(self.nodes)
+        n = Node(x, y, self.NODE_RADIUS, name_from_index(i), i)
         self.nodes.append(n)
+        self.node_names.append(n.name)
+        self.edge_lists.append([])
         self.surface.add(n)
         self.surface.redraw()
         return n
@@ -220,12 +323,15 @@ class GraphManipulator(InteractiveSurface):
         e = self.find_edge(x, y)
         if e:
             del self.edges[e.endpoint_ids]
+            self.unlink_edge(e)
             for o in self.edge_by_weight[e.w+1:]:
+                self.unlink_edge(o)
                 o.w -= 1
+                self.link_edge(o)
             del self.edge_by_weight[e.w]
             self.surface.remove(e)
             self.surface.redraw()
-            self.process_graph()
+            self.process_graph(compute.Delete(e.w))
             return
         await self.add_edge_from(self.add_node(x, y))
 
@@ -244,9 +350,10 @@ class GraphManipulator(InteractiveSurface):
         e = Edge(u, v, len(self.edges))
         if self.edges.setdefault(e.endpoint_ids, e) is e:
             self.edge_by_weight.append(e)
+            self.link_edge(e)
             self.surface.add(e)
             self.surface.redraw()
-            self.process_graph()
+            self.process_graph(compute.Append())
         else:
             print('Edge %s already exists' % e)
 
@@ -269,29 +376,86 @@ class GraphManipulator(InteractiveSurface):
     def swap_edge_weights(self, i, j):
         edges = self.edge_by_weight
         if 0 <= i < len(edges) and 0 <= j < len(edges):
+            self.unlink_edge(edges[i])
+            self.unlink_edge(edges[j])
             edges[i], edges[j] = edges[j], edges[i]
             edges[i].w = i
             edges[j].w = j
+            self.link_edge(edges[i])
+            self.link_edge(edges[j])
             self.surface.redraw()
-            self.process_graph()
-
-    def process_graph(self):
-        node_index = {id(node): i for i, node in enumerate(self.nodes)}
-        node_names = [node.name for node in self.nodes]
-        edge_lists = [[] for _ in self.nodes]
-        for e in self.edges.values():
-            u = node_index[id(e.u)]
-            v = node_index[id(e.v)]
-            edge_lists[u].append((v, e.w))
-            edge_lists[v].append((u, e.w))
-        edges = [(node_index[id(e.u)], node_index[id(e.v)])
-                 for e in self.edge_by_weight]
-
+            self.process_graph(compute.Swap(i) if j == i + 1 else None)
+
+    def link_edge(self, e):
+        u, v = e.endpoint_ids
+        self.edge_lists[u].append((v, e.w))
+        self.edge_lists[v].append((u, e.w))
+
+    def unlink_edge(self, e):
+        u, v = e.endpoint_ids
+        self.edge_lists[u].remove((v, e.w))
+        self.edge_lists[v].remove((u, e.w))
+
+    def process_graph(self, delta=None):
+        # Snapshot the graph, since the worker reads it while later edits
+        # modify it
+        csr = compute.CSR.from_edge_lists(self.edge_lists)
+        node_names = list(self.node_names)
+        self.pending_edits.append((csr, node_names, delta))
+        self.scheduler.request()
+
+    def submit_compute(self):
+        edits, self.pending_edits = self.pending_edits, []
+        self.worker.submit(*edits)
+
+    def compute_mtime(self):
         try:
-            fn = importlib.reload(compute).process_graph
-            fn(edge_lists, edges, node_names)
-        except:
-            traceback.print_exc()
+            return os.stat(compute.__file__).st_mtime_ns
+        except OSError:
+            return None
+
+    def reload_compute(self):
+        '''
+        Reload the compute module if RELOAD_COMPUTE is set and compute.py
+        has been modified since it was last loaded.
+        Return True if the module was reloaded.
+        '''
+        if not self.RELOAD_COMPUTE:
+            return False
+        mtime = self.compute_mtime()
+        if mtime == self.compute_loaded:
+            return False
+        self.compute_loaded = mtime
+        importlib.reload(compute)
+        return True
+
+    def run_compute(self, requests, previous, cancelled):
+        '''
+        Run on the worker thread: compute the result for the last edit in
+        `requests` and print its report. A single edit is applied to
+        `previous`; after several edits, or without `previous`, the final
+        state is computed from scratch, since there is no one delta from
+        `previous` to it and intermediate states are never shown.
+        Only the report is cancelled by a newer edit: the result is always
+        computed in full, to be cached and updated by the next run.
+        '''
+        if self.reload_compute():
+            # Results of the old module cannot be updated by the new one
+            previous = None
+        csr, node_names, delta = requests[-1]
+        # Rebuild the snapshot from the reloaded module's classes
+        csr = compute.CSR(*csr)
+        if previous is None or len(requests) > 1:
+            previous = delta = None
+        elif delta is not None:
+            delta = getattr(compute, type(delta).__name__)(*delta)
+        kwargs = dict(previous=previous, delta=delta, cancelled=cancelled)
+        if self.REPORT_FILE is None:
+            return compute.process_graph(csr, node_names, **kwargs)
+        with open(self.REPORT_FILE, 'w') as fp:
+            sink = compute.TextSink(fp, node_names)
+            return compute.process_graph(
+                csr, node_names, sink=sink, **kwargs)
 
 
 if __name__ == "__main__":